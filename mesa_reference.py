@@ -3,10 +3,18 @@ MESA: Machine-Enforceable Schema for Attribution
 Node Reference Edition - Enforces attribution on retrieval
 """
 
-from typing import Dict, List, Optional, Union
+import logging
+import sys
+from typing import Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass
 
 
+logger = logging.getLogger(__name__)
+
+# Fields whose values are typically shared by many nodes
+_SHARED_FIELDS = ('@type', 'licenseName', 'licenseLink', 'creator')
+
+
 @dataclass
 class AttributionBundle:
     """Required attribution fields that must travel with CC-licensed nodes"""
@@ -22,11 +30,25 @@ class AttributionBundle:
         }
 
 
+def _is_cc_license(license_name: str) -> bool:
+    """Whether a licenseName falls under MESA enforcement"""
+    return isinstance(license_name, str) and license_name.startswith('CC')
+
+
 class MESAReference:
     """
     Enforces attribution requirements when nodes are retrieved/referenced.
     
     Core principle: CC-licensed nodes ALWAYS include attribution metadata.
+    
+    The graph is snapshotted at construction: retrieval and validation work
+    from that snapshot, and every retrieval returns a fresh copy. Later changes
+    to the input graph, to nodes_by_id or to returned nodes are not seen;
+    build a new MESAReference to pick them up.
+    
+    Construction deduplicates shared string values (see _SHARED_FIELDS) in
+    the input node dicts in place; values stay equal, only their identity
+    changes.
     """
     
     def __init__(self, graph_data: Dict):
@@ -34,6 +56,55 @@ class MESAReference:
             node['@id']: node 
             for node in graph_data.get('@graph', [])
         }
+        
+        # Derive everything retrieval needs in one pass over the nodes:
+        # - deduplicated shared values, so nodes reference one string per
+        #   value. This rewrites the caller's node dicts in place. The
+        #   canonical strings live only as long as the graph; str subclasses
+        #   are left alone so their type is preserved.
+        # - CC classification, so retrievals don't re-inspect licenseName
+        # - the servable view: a snapshot of each node, CC nodes bundled with
+        #   their attribution, CC nodes with incomplete attribution left out.
+        #   Retrievals hand out copies so callers cannot alter the snapshot.
+        # - why each blocked CC node cannot be retrieved
+        # - GroundedIn adjacency
+        canonical = {}
+        cc_ids = set()
+        self._served = {}
+        self._blocked_reasons = {}
+        self._grounded_in = {}
+        for node_id, node in self.nodes_by_id.items():
+            for field in _SHARED_FIELDS:
+                value = node.get(field)
+                if type(value) is str:
+                    node[field] = canonical.setdefault(value, value)
+            
+            # This is simplified - in reality would parse the content or
+            # look at a separate relations structure
+            if 'derivedFrom' in node:
+                self._grounded_in[node_id] = (node['derivedFrom'],)
+            
+            license_name = node.get('licenseName', '')
+            if not _is_cc_license(license_name):
+                self._served[node_id] = {**node}
+                continue
+            
+            cc_ids.add(node_id)
+            attribution = self._extract_attribution(node, license_name)
+            if attribution:
+                self._served[node_id] = self._bundle_with_attribution(
+                    node, attribution
+                )
+            else:
+                missing = [
+                    field for field in ('sourceLink', 'creator')
+                    if not node.get(field)
+                ]
+                self._blocked_reasons[node_id] = (
+                    f"CC-licensed node missing required fields: {', '.join(missing)}"
+                )
+        
+        self._cc_ids = frozenset(cc_ids)
     
     def get_node(self, node_id: str) -> Optional[Dict]:
         """
@@ -46,25 +117,17 @@ class MESAReference:
         
         Returns None if node not found or missing required attribution.
         """
-        node = self.nodes_by_id.get(node_id)
-        if not node:
-            return None
-        
-        # Check if this is CC-licensed content
-        license_name = node.get('licenseName', '')
-        if license_name.startswith('CC'):
-            # Verify required attribution fields exist
-            attribution = self._extract_attribution(node)
-            if not attribution:
+        node = self._served.get(node_id)
+        if node is None:
+            if node_id in self._cc_ids:
                 # Cannot serve CC content without complete attribution
-                print(f"WARNING: Node {node_id} has CC license but missing attribution fields")
-                return None
-            
-            # Return node with guaranteed attribution fields
-            return self._bundle_with_attribution(node, attribution)
+                logger.warning(
+                    "Node %s has CC license but missing attribution fields", node_id
+                )
+            return None
         
-        # Non-CC content can be returned as-is
-        return node
+        # Fresh copy per call so no caller can alter what others are served
+        return {**node}
     
     def get_nodes(self, node_ids: List[str]) -> List[Dict]:
         """
@@ -73,11 +136,19 @@ class MESAReference:
         Any CC-licensed nodes automatically include attribution.
         Nodes with incomplete attribution are excluded.
         """
+        served = self._served
+        cc_ids = self._cc_ids
         nodes = []
+        append = nodes.append
         for node_id in node_ids:
-            node = self.get_node(node_id)
-            if node:
-                nodes.append(node)
+            node = served.get(node_id)
+            if node is not None:
+                append({**node})
+            elif node_id in cc_ids:
+                logger.warning(
+                    "Node %s has CC license but missing attribution fields",
+                    node_id
+                )
         return nodes
     
     def get_node_with_dependencies(self, node_id: str) -> Dict:
@@ -99,14 +170,70 @@ class MESAReference:
             'dependencies': dependencies
         }
     
-    def _extract_attribution(self, node: Dict) -> Optional[AttributionBundle]:
-        """Extract required attribution fields from node"""
-        license_name = node.get('licenseName', '')
+    def get_node_with_dependencies_deep(
+        self,
+        node_id: str,
+        max_depth: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Retrieve a node along with its transitive GroundedIn dependencies
+        
+        Dependencies are fetched breadth-first, one batch per level, up to
+        max_depth levels (unbounded if None). Nodes that cannot be served are
+        excluded and not expanded further.
+        
+        Returns {'root': node, 'nodes': [...], 'edges': [(from_id, to_id), ...]}
+        or None if the root node cannot be served.
+        """
+        root = self.get_node(node_id)
+        if not root:
+            return None
+        
+        grounded_in = self._grounded_in
+        visited = {node_id}
+        served_ids = {node_id}
+        nodes = []
+        edges = []
+        frontier = [node_id]
+        depth = 0
+        
+        while frontier and (max_depth is None or depth < max_depth):
+            batch = []
+            candidate_edges = []
+            for parent_id in frontier:
+                for dep_id in grounded_in.get(parent_id, ()):
+                    candidate_edges.append((parent_id, dep_id))
+                    if dep_id not in visited:
+                        visited.add(dep_id)
+                        batch.append(dep_id)
+            
+            fetched = self.get_nodes(batch)
+            frontier = [dep['@id'] for dep in fetched]
+            nodes.extend(fetched)
+            served_ids.update(frontier)
+            edges.extend(
+                edge for edge in candidate_edges if edge[1] in served_ids
+            )
+            depth += 1
+        
+        return {
+            'root': root,
+            'nodes': nodes,
+            'edges': edges
+        }
+    
+    def _extract_attribution(
+        self,
+        node: Dict,
+        license_name: str
+    ) -> Optional[AttributionBundle]:
+        """Extract required attribution fields from a CC-licensed node"""
         source_link = node.get('sourceLink', '')
         creator = node.get('creator', '')
         
-        # All three must be present and non-empty
-        if license_name.startswith('CC') and source_link and creator:
+        # sourceLink and creator must both be non-empty; license already
+        # classified by caller
+        if source_link and creator:
             return AttributionBundle(
                 license_name=license_name,
                 source_link=source_link,
@@ -126,22 +253,11 @@ class MESAReference:
         Even if fields exist in node, we explicitly add them to guarantee
         they're present in any view/export of this data.
         """
-        bundled = node.copy()
-        bundled.update(attribution.to_dict())
-        return bundled
+        return {**node, **attribution.to_dict()}
     
-    def _extract_grounded_in_refs(self, node: Dict) -> List[str]:
+    def _extract_grounded_in_refs(self, node: Dict) -> Tuple[str, ...]:
         """Extract node IDs that this node is GroundedIn"""
-        # This is simplified - in reality would parse the content or
-        # look at a separate relations structure
-        refs = []
-        content = node.get('content', '')
-        
-        # Simple extraction (would be more sophisticated in practice)
-        if 'derivedFrom' in node:
-            refs.append(node['derivedFrom'])
-        
-        return refs
+        return self._grounded_in.get(node['@id'], ())
     
     def validate_node_for_retrieval(self, node_id: str) -> tuple[bool, Optional[str]]:
         """
@@ -149,23 +265,15 @@ class MESAReference:
         
         Returns: (can_retrieve, error_message)
         """
-        node = self.nodes_by_id.get(node_id)
-        if not node:
-            return False, f"Node {node_id} not found"
+        # The graph is fixed after construction, so every outcome is known
+        if node_id in self._served:
+            return True, None
         
-        license_name = node.get('licenseName', '')
-        if license_name.startswith('CC'):
-            # Check required fields
-            missing = []
-            if not node.get('sourceLink'):
-                missing.append('sourceLink')
-            if not node.get('creator'):
-                missing.append('creator')
-            
-            if missing:
-                return False, f"CC-licensed node missing required fields: {', '.join(missing)}"
+        reason = self._blocked_reasons.get(node_id)
+        if reason is None:
+            return False, f"Node {node_id} not found"
         
-        return True, None
+        return False, reason
 
 
 # Example API integration
@@ -222,6 +330,8 @@ class DiscourseGraphAPI:
 # Example usage and tests
 if __name__ == '__main__':
     
+    logging.basicConfig(format='%(levelname)s: %(message)s', stream=sys.stdout)
+    
     # Sample graph data
     graph = {
         '@graph': [
@@ -233,6 +343,7 @@ if __name__ == '__main__':
                 'licenseLink': 'https://creativecommons.org/licenses/by/4.0/',
                 'sourceLink': 'https://example.com/dataset-001',
                 'creator': 'Jane Smith',
+                'derivedFrom': 'pages:source-001',
                 'content': 'Detailed findings...'
             },
             {
@@ -301,3 +412,14 @@ if __name__ == '__main__':
     print("Retrieved nodes:")
     for node in nodes:
         print(f"  - {node['title']} (creator: {node.get('creator', 'N/A')})")
+    print()
+    
+    print("=" * 60)
+    print("Test 5: Transitive dependency retrieval")
+    print("=" * 60)
+    result = mesa.get_node_with_dependencies_deep('pages:evidence-001')
+    print(f"Root: {result['root']['title']}")
+    for dep in result['nodes']:
+        print(f"  - {dep['title']} (creator: {dep['creator']})")
+    for from_id, to_id in result['edges']:
+        print(f"  {from_id} -> {to_id}")